@@ -5,11 +5,23 @@ import pandas as pd
 import threading
 import queue
 import os
+import glob
+import time
 import subprocess
+from history_index import HistoryIndex
+from export_scheduler import ExportScheduler, atomic_export, is_timestamped_copy
 
 OUTPUT_FILE_NAME = "Clasificacion.xlsx"
 OUTPUT_FOLDER_PATH = r"C:\Users\Omar Zambrano\Desktop\Final DHL"
 FILE_PATH = os.path.join(OUTPUT_FOLDER_PATH, OUTPUT_FILE_NAME)
+HISTORY_FOLDER_PATH = os.path.join(OUTPUT_FOLDER_PATH, "historial")
+HISTORY_COMPACT_THRESHOLD = 50000
+HISTORY_CAPACITY = 10_000_000
+
+EXPORT_RETRY_INTERVAL = 5
+EXPORT_FALLBACK_AFTER = 60
+EXPORT_SHUTDOWN_TIMEOUT = 10
+WORKER_CLOSE_TIMEOUT = 5
 
 SCAN_QUEUE = queue.Queue()
 PROCESS_RUNNING = False
@@ -18,6 +30,11 @@ STORES = ['DHL', '99MINUTOS', 'FEDEX', 'TERRESTRE', 'BLINK']
 DATA_CACHE = {}
 COUNTS = {store: 0 for store in STORES}
 TOTAL_SCANS = 0
+HISTORY = None
+COMMITTED_ROWS = {}
+COMMIT_LOCK = threading.Lock()
+FALLBACK_FILES = {}
+FALLBACK_LOCK = threading.Lock()
 
 COLORS = {
     'bg_primary': '#f8f9fa',
@@ -43,68 +60,180 @@ COLORS = {
     'BLINK': '#8b3f99'
 }
 
-def load_initial_data():
-    global DATA_CACHE, COUNTS, TOTAL_SCANS
-    DATA_CACHE = {}
-    COUNTS = {store: 0 for store in STORES}
-    TOTAL_SCANS = 0
+def open_history():
+    global HISTORY
+    if HISTORY is not None:
+        return
+    try:
+        HISTORY = HistoryIndex(HISTORY_FOLDER_PATH, capacity=HISTORY_CAPACITY)
+    except Exception as e:
+        HISTORY = None
+        notify_error("Error de Historial", f"No se pudo abrir el historial de códigos.\nError: {e}")
+
+def close_history():
+    global HISTORY
+    if HISTORY is not None:
+        HISTORY.close()
+        HISTORY = None
+
+def history_key(store_name, code):
+    return f"{store_name}\t{code}"
+
+def commit_history(snapshot):
+    # Solo se llama con datos ya escritos en disco, para que el historial
+    # nunca marque como duplicado un código que no quedó guardado. Dentro de
+    # una sesión cada hoja solo crece al final, así que basta con agregar las
+    # filas posteriores a las ya confirmadas.
+    history = HISTORY
+    if history is None:
+        return
+    with COMMIT_LOCK:
+        for sheet_name, df in snapshot.items():
+            start = COMMITTED_ROWS.get(sheet_name, 0)
+            if start > len(df):
+                start = 0
+            for code in df['Code'].iloc[start:].dropna():
+                history.add(history_key(sheet_name, str(code)))
+            COMMITTED_ROWS[sheet_name] = len(df)
+    if len(history.pending) >= HISTORY_COMPACT_THRESHOLD:
+        history.compact()
+
+def notify_error(title, message):
+    try:
+        app.after(0, messagebox.showerror, title, message)
+    except Exception:
+        print(f"{title}: {message}")
 
+def notify_banner(text, duration=8000):
     try:
-        if not os.path.exists(FILE_PATH):
-            return
+        app.after(0, app.show_banner_message, text, duration)
+    except Exception:
+        pass
 
-        xls = pd.ExcelFile(FILE_PATH)
-        sheets = xls.sheet_names
+def find_fallback_files():
+    base, ext = os.path.splitext(OUTPUT_FILE_NAME)
+    candidates = glob.glob(os.path.join(OUTPUT_FOLDER_PATH, f"{base}_*{ext}"))
+    return sorted(p for p in candidates if is_timestamped_copy(FILE_PATH, p))
 
-        for sheet in sheets:
-            df = xls.parse(sheet, dtype={'Code': str})
-            DATA_CACHE[sheet] = df
-            ok_counts = df.shape[0]
-            if sheet in COUNTS:
-                COUNTS[sheet] = ok_counts
-            TOTAL_SCANS += ok_counts
+def read_workbook(path):
+    xls = pd.ExcelFile(path)
+    return {sheet: xls.parse(sheet, dtype={'Code': str}) for sheet in xls.sheet_names}
 
-    except Exception as e:
-        messagebox.showerror("Error de Lectura", f"No se pudo leer el archivo Excel.\nError: {e}")
+def load_initial_data():
+    global DATA_CACHE, COUNTS, TOTAL_SCANS
+    DATA_CACHE = {}
+    COUNTS = {store: 0 for store in STORES}
+    TOTAL_SCANS = 0
 
-def save_current_data():
-    try:
-        os.makedirs(OUTPUT_FOLDER_PATH, exist_ok=True)
-        writer = pd.ExcelWriter(FILE_PATH, engine='xlsxwriter')
-        workbook = writer.book
+    open_history()
+    with COMMIT_LOCK:
+        COMMITTED_ROWS.clear()
 
-        fmt_header_base = {'bold': True, 'border': 1, 'align': 'center', 'valign': 'vcenter', 'font_size': 12}
-        fmt_text = workbook.add_format({'border': 1, 'align': 'left', 'valign': 'vcenter', 'num_format': '@'})
-        fmt_center = workbook.add_format({'border': 1, 'align': 'center', 'valign': 'vcenter'})
+    # Un snapshot de la sesión anterior que aún espera al Excel bloqueado es
+    # más reciente que el archivo en disco: se parte de él.
+    latest = EXPORTER.latest()
+    if latest:
+        DATA_CACHE = {sheet: df.copy() for sheet, df in latest.items()}
 
-        all_sheets = set(STORES).union(DATA_CACHE.keys())
+    sources = [FILE_PATH] if os.path.exists(FILE_PATH) else []
+    recovered = []
+    for path in sources + find_fallback_files():
+        try:
+            sheets = read_workbook(path)
+        except Exception as e:
+            notify_error("Error de Lectura", f"No se pudo leer el archivo '{os.path.basename(path)}'.\nError: {e}")
+            continue
 
-        for sheet_name in sorted(all_sheets):
-            df = DATA_CACHE.get(sheet_name, pd.DataFrame(columns=['Timestamp', 'Code', 'Status']))
-            df_final = df[df['Status'] == 'OK'].copy()
-            df_final.to_excel(writer, sheet_name=sheet_name, index=False)
+        for sheet, df in sheets.items():
+            if sheet in DATA_CACHE:
+                df = pd.concat([DATA_CACHE[sheet], df], ignore_index=True)
+                df = df.drop_duplicates(subset='Code', keep='first', ignore_index=True)
+            DATA_CACHE[sheet] = df
+        if path != FILE_PATH:
+            recovered.append(path)
+
+    # Las copias de respaldo quedan integradas en DATA_CACHE; se borran cuando
+    # un snapshot posterior llega al archivo principal.
+    with FALLBACK_LOCK:
+        for path in recovered:
+            FALLBACK_FILES[path] = EXPORTER.version
+
+    for sheet, df in DATA_CACHE.items():
+        ok_counts = df.shape[0]
+        if sheet in COUNTS:
+            COUNTS[sheet] = ok_counts
+        TOTAL_SCANS += ok_counts
+
+    if recovered:
+        notify_banner(f"Se recuperaron {len(recovered)} copias de respaldo; se integrarán al guardar")
+
+def build_snapshot():
+    snapshot = {}
+    cache = dict(DATA_CACHE)
+    for sheet_name in sorted(set(STORES).union(cache.keys())):
+        df = cache.get(sheet_name, pd.DataFrame(columns=['Timestamp', 'Code', 'Status']))
+        snapshot[sheet_name] = df[df['Status'] == 'OK'].copy()
+    return snapshot
+
+def write_workbook(path, snapshot):
+    writer = pd.ExcelWriter(path, engine='xlsxwriter')
+    workbook = writer.book
+
+    fmt_header_base = {'bold': True, 'border': 1, 'align': 'center', 'valign': 'vcenter', 'font_size': 12}
+    fmt_text = workbook.add_format({'border': 1, 'align': 'left', 'valign': 'vcenter', 'num_format': '@'})
+    fmt_center = workbook.add_format({'border': 1, 'align': 'center', 'valign': 'vcenter'})
+
+    for sheet_name, df_final in snapshot.items():
+        df_final.to_excel(writer, sheet_name=sheet_name, index=False)
+
+        worksheet = writer.sheets[sheet_name]
+        header_color = COLORS.get(sheet_name, '#dddddd')
+        fmt_header = workbook.add_format(fmt_header_base)
+        fmt_header.set_bg_color(header_color)
+
+        worksheet.set_column('A:A', 20, fmt_center)
+        worksheet.set_column('B:B', 30, fmt_text)
+        worksheet.set_column('C:C', 10, fmt_center)
+
+        for col_num, value in enumerate(df_final.columns.values):
+            worksheet.write(0, col_num, value, fmt_header)
+
+    writer.close()
+
+def export_snapshot(snapshot, target):
+    return atomic_export(write_workbook, snapshot, target)
+
+def export_committed(status, version, snapshot, path):
+    with FALLBACK_LOCK:
+        if status == 'fallback':
+            FALLBACK_FILES[path] = version
+            merged = []
+        else:
+            merged = [p for p, v in FALLBACK_FILES.items() if v < version]
+            for p in merged:
+                del FALLBACK_FILES[p]
 
-            worksheet = writer.sheets[sheet_name]
-            header_color = COLORS.get(sheet_name, '#dddddd')
-            fmt_header = workbook.add_format(fmt_header_base)
-            fmt_header.set_bg_color(header_color)
+    commit_history(snapshot)
 
-            worksheet.set_column('A:A', 20, fmt_center)
-            worksheet.set_column('B:B', 30, fmt_text)
-            worksheet.set_column('C:C', 10, fmt_center)
+    for p in merged:
+        try:
+            os.remove(p)
+        except OSError as e:
+            print(f"No se pudo borrar la copia de respaldo {p}: {e}")
 
-            for col_num, value in enumerate(df_final.columns.values):
-                worksheet.write(0, col_num, value, fmt_header)
+def notify_export_status(status, version, detail):
+    try:
+        app.after(0, app.show_export_status, status, version, detail)
+    except Exception:
+        pass
 
-        writer.close()
-        return True
+EXPORTER = ExportScheduler(write_workbook, on_status=notify_export_status,
+                           on_committed=export_committed,
+                           retry_interval=EXPORT_RETRY_INTERVAL,
+                           fallback_after=EXPORT_FALLBACK_AFTER)
 
-    except PermissionError:
-        messagebox.showerror("Error de Permiso", f"No se puede guardar el archivo '{OUTPUT_FILE_NAME}'.\n\nCIERRE EL EXCEL Y VUELVA A INTENTARLO.")
-        return False
-    except Exception as e:
-        messagebox.showerror("Error de Escritura", f"Error crítico al guardar: {e}")
-        return False
+def save_current_data():
+    return EXPORTER.submit(build_snapshot(), FILE_PATH)
 
 def open_output_folder():
     try:
@@ -142,7 +271,7 @@ def process_worker():
 
             df = DATA_CACHE[store_name]
 
-            if code in df['Code'].values:
+            if code in df['Code'].values or (HISTORY is not None and history_key(store_name, code) in HISTORY):
                 status = 'DUP'
             else:
                 status = 'OK'
@@ -159,8 +288,8 @@ def process_worker():
         finally:
             SCAN_QUEUE.task_done()
 
-    app.after(0, app.save_button.config, {'state': tk.NORMAL})
     save_current_data()
+    app.after(0, app.save_button.config, {'state': tk.NORMAL})
     app.after(0, app.set_inactive_mode)
 
 class ModernButton(tk.Canvas):
@@ -313,6 +442,9 @@ class App(tk.Tk):
         self.input_buffer = ""
         self.store_cards = {}
         self.pulse_animation_id = None
+        self.subtitle_restore_id = None
+        self.subtitle_original_text = None
+        self.close_deadline = 0
         self.last_width = 0
         self.last_height = 0
 
@@ -667,22 +799,51 @@ class App(tk.Tk):
             self.save_button.set_state('normal')
 
     def manual_save(self):
-        if save_current_data():
-            original_text = self.banner_subtitle.cget('text')
-            self.banner_subtitle.config(text="Datos guardados exitosamente")
-            self.after(2000, lambda: self.banner_subtitle.config(text=original_text))
+        save_current_data()
+        self.show_banner_message("Guardando datos...")
+
+    def show_banner_message(self, text, duration=3000):
+        if self.subtitle_restore_id:
+            self.after_cancel(self.subtitle_restore_id)
+        else:
+            self.subtitle_original_text = self.banner_subtitle.cget('text')
+        self.banner_subtitle.config(text=text)
+        self.subtitle_restore_id = self.after(duration, self.restore_banner_message, text)
+
+    def restore_banner_message(self, text):
+        self.subtitle_restore_id = None
+        if self.banner_subtitle.cget('text') == text:
+            self.banner_subtitle.config(text=self.subtitle_original_text)
+
+    def show_export_status(self, status, version, detail):
+        if status == 'saved':
+            self.show_banner_message("Datos guardados exitosamente")
+        elif status == 'locked':
+            self.show_banner_message(f"'{OUTPUT_FILE_NAME}' está abierto: se reintentará el guardado en segundo plano", 6000)
+        elif status == 'fallback':
+            self.show_banner_message(f"Archivo bloqueado: datos guardados en '{os.path.basename(detail)}'", 8000)
+        else:
+            messagebox.showerror("Error de Escritura", f"Error crítico al guardar: {detail}")
 
     def on_closing(self):
         if PROCESS_RUNNING:
             if messagebox.askyesno("Detener Proceso",
                                   "El sistema está activo.\n¿Desea detener y salir?"):
                 self.stop_process()
-                self.after(1000, self.destroy)
+                self.close_deadline = time.monotonic() + WORKER_CLOSE_TIMEOUT
+                self.after(100, self.close_when_worker_done)
             else:
                 return
         else:
             self.destroy()
 
+    def close_when_worker_done(self):
+        global worker_thread
+        if worker_thread and worker_thread.is_alive() and time.monotonic() < self.close_deadline:
+            self.after(100, self.close_when_worker_done)
+        else:
+            self.destroy()
+
     def update_scan_interface(self, store, code, status):
         color = COLORS['success'] if status == 'OK' else COLORS['error']
         status_text = "OK" if status == 'OK' else "DUPLICADO"
@@ -707,3 +868,5 @@ if __name__ == "__main__":
     app = App()
     worker_thread = None
     app.mainloop()
+    EXPORTER.shutdown(timeout=EXPORT_SHUTDOWN_TIMEOUT)
+    close_history()
@@ -0,0 +1,424 @@
+"""Suite de regresion de rendimiento del clasificador.
+
+Ejecuta process_worker, load_initial_data y save_current_data del modulo
+ClasificadorHID_PRO con la app de Tk reemplazada por un stub, sobre perfiles
+de carga con nombre. Cada perfil trabaja en una carpeta temporal propia, asi
+que nunca toca el Excel real ni el historial de codigos.
+
+Uso:
+
+    python benchmarks/bench_classifier.py                  # compara contra la baseline
+    python benchmarks/bench_classifier.py --require-baseline   # en CI
+    python benchmarks/bench_classifier.py --update-baseline
+    python benchmarks/bench_classifier.py --profile burst_tunnel --scale 0.2
+
+Las baselines se guardan en benchmarks/baselines.json (una por perfil). Sin
+--require-baseline, un perfil sin baseline se registra en esa ejecucion; con
+--require-baseline falla. El script termina con codigo 1 si alguna metrica de
+GATED_METRICS supera su baseline en mas de la tolerancia y ademas en mas del
+piso absoluto de esa metrica, para que el ruido en valores pequenos no
+dispare falsos positivos. La tolerancia es --threshold (25% por defecto) mas
+dos veces la dispersion relativa (max - min) / mediana que la baseline
+registro entre sus repeticiones: una metrica que ya variaba 10% entre
+corridas tolera 45%.
+
+Cada perfil alimenta SCAN_QUEUE desde un hilo productor a su propio ritmo
+(escaneos por segundo), empezando cuando el worker termino de cargar los
+datos. Los ritmos estan muy por debajo de lo que el worker procesa, como en
+la operacion real: la latencia mide el costo de cada escaneo y no una cola
+acumulada. Si la utilizacion del worker supera SATURATION_LIMIT el perfil se
+marca saturado, se avisa y su p95 no se compara. Antes de las --repeats
+ejecuciones medidas se hace una de calentamiento que se descarta; cada
+metrica es la mediana de las repeticiones.
+
+El historial de codigos se abre con capacidad BENCH_HISTORY_CAPACITY en vez
+de la de produccion (filtro de 11.4 MiB), para que peak_mb refleje la
+memoria del worker y no la del filtro.
+
+Metricas por perfil:
+
+    load_s         load_initial_data sobre el libro precargado.
+    worker_cpu_s   tiempo de CPU del hilo del worker en process_worker
+                   (carga, escaneos y snapshot final); informativa, depende
+                   de la carga y no se compara.
+    per_scan_ms    CPU del worker desde que termino la carga, dividido entre
+                   los escaneos del perfil.
+    utilization    CPU de escaneo dividido entre la duracion del perfil a su
+                   ritmo nominal.
+    p95_latency_ms tiempo desde que la linea entra a SCAN_QUEUE hasta que el
+                   worker publica el resultado en la interfaz.
+    save_s         exportacion sincrona (build_snapshot + export_snapshot) de
+                   los datos al final del turno; save_current_data solo encola
+                   el snapshot para el hilo de exportacion.
+    peak_mb        pico de memoria de Python (tracemalloc) en process_worker.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import pandas as pd
+
+import ClasificadorHID_PRO as clasificador
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_REPEATS = 5
+SATURATION_LIMIT = 0.5
+BENCH_HISTORY_CAPACITY = 10_000
+
+METRIC_FLOORS = {
+    'load_s': 0.05,
+    'worker_cpu_s': 0.1,
+    'per_scan_ms': 0.2,
+    'p95_latency_ms': 5.0,
+    'save_s': 0.05,
+    'peak_mb': 2.0,
+}
+
+GATED_METRICS = ['load_s', 'per_scan_ms', 'p95_latency_ms', 'save_s', 'peak_mb']
+
+
+class StubApp:
+    def __init__(self):
+        self.save_button = self
+        self.processed_at = []
+        self.ready = threading.Event()
+        self.ready_cpu = None
+
+    def after(self, delay, func, *args):
+        if func in (self.update_scan_interface, self.update_initial_interface,
+                    clasificador.messagebox.showerror):
+            func(*args)
+
+    def config(self, *args, **kwargs):
+        pass
+
+    def update_scan_interface(self, store, code, status):
+        self.processed_at.append(time.perf_counter())
+
+    def update_initial_interface(self):
+        # after() lo ejecuta en el hilo del worker: marca el fin de la carga.
+        self.ready_cpu = time.thread_time()
+        self.ready.set()
+
+    def set_inactive_mode(self):
+        pass
+
+
+class StubMessagebox:
+    def __init__(self):
+        self.errors = []
+
+    def showerror(self, title, message):
+        self.errors.append(f"{title}: {message}")
+
+    def showinfo(self, title, message):
+        pass
+
+    def askyesno(self, title, message):
+        return True
+
+
+def make_code(rng):
+    return f"JD{rng.randrange(10**12):012d}"
+
+
+def steady_single_scanner(rng, scale):
+    count = max(1, int(150 * scale))
+    lines = [f"DHL,{make_code(rng)}" for _ in range(count)]
+    return {'lines': lines, 'rate': 30}
+
+
+def burst_tunnel(rng, scale):
+    count = max(1, int(2000 * scale))
+    lines = [f"{rng.choice(clasificador.STORES)},{make_code(rng)}" for _ in range(count)]
+    return {'lines': lines, 'rate': 300}
+
+
+def duplicate_rescan(rng, scale):
+    count = max(1, int(1500 * scale))
+    pool = [make_code(rng) for _ in range(max(1, count // 10))]
+    lines = [f"{rng.choice(clasificador.STORES)},{rng.choice(pool)}" for _ in range(count)]
+    return {'lines': lines, 'rate': 250}
+
+
+def many_unknown_stores(rng, scale):
+    count = max(1, int(1500 * scale))
+    stores = [f"TIENDA{i:03d}" for i in range(max(1, int(200 * scale)))]
+    lines = [f"{rng.choice(stores)},{make_code(rng)}" for _ in range(count)]
+    return {'lines': lines, 'rate': 250}
+
+
+def long_shift(rng, scale):
+    # Final de un turno largo: el libro ya trae 50k filas y el operador
+    # sigue escaneando a ritmo de tunel, con cada escaneo pagando el costo
+    # de los DataFrames grandes.
+    preload_rows = max(1, int(50000 * scale))
+    count = max(1, int(1200 * scale))
+    preload = {store: [] for store in clasificador.STORES}
+    for i in range(preload_rows):
+        preload[clasificador.STORES[i % len(clasificador.STORES)]].append(make_code(rng))
+    lines = [f"{rng.choice(clasificador.STORES)},{make_code(rng)}" for _ in range(count)]
+    return {'lines': lines, 'rate': 120, 'preload': preload}
+
+
+PROFILES = {
+    'steady_single_scanner': steady_single_scanner,
+    'burst_tunnel': burst_tunnel,
+    'duplicate_rescan': duplicate_rescan,
+    'many_unknown_stores': many_unknown_stores,
+    'long_shift': long_shift,
+}
+
+
+def point_module_at(workdir):
+    clasificador.OUTPUT_FOLDER_PATH = workdir
+    clasificador.FILE_PATH = os.path.join(workdir, clasificador.OUTPUT_FILE_NAME)
+    clasificador.HISTORY_FOLDER_PATH = os.path.join(workdir, "historial")
+    clasificador.HISTORY_CAPACITY = BENCH_HISTORY_CAPACITY
+
+
+def write_preloaded_workbook(workdir, preload):
+    point_module_at(workdir)
+    timestamp = "2024-01-01 08:00:00"
+    clasificador.DATA_CACHE = {
+        store: pd.DataFrame({'Timestamp': timestamp, 'Code': codes, 'Status': 'OK'},
+                            columns=['Timestamp', 'Code', 'Status'])
+        for store, codes in preload.items()
+    }
+    clasificador.export_snapshot(clasificador.build_snapshot(), clasificador.FILE_PATH)
+    clasificador.DATA_CACHE = {}
+
+
+def reset_workdir(workdir, seed_workbook):
+    shutil.rmtree(workdir, ignore_errors=True)
+    os.makedirs(workdir)
+    if seed_workbook:
+        shutil.copy(seed_workbook, os.path.join(workdir, clasificador.OUTPUT_FILE_NAME))
+    point_module_at(workdir)
+
+
+def feed_queue(lines, rate, enqueued_at, ready):
+    ready.wait()
+    interval = 1.0 / rate
+    start = time.perf_counter()
+    for i, line in enumerate(lines):
+        delay = start + i * interval - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        enqueued_at.append(time.perf_counter())
+        clasificador.SCAN_QUEUE.put(line)
+    clasificador.PROCESS_RUNNING = False
+
+
+def run_worker(workload, stub_app):
+    enqueued_at = []
+    clasificador.app = stub_app
+    clasificador.PROCESS_RUNNING = True
+    producer = threading.Thread(target=feed_queue,
+                                args=(workload['lines'], workload['rate'], enqueued_at, stub_app.ready))
+    producer.daemon = True
+    producer.start()
+
+    start = time.thread_time()
+    clasificador.process_worker()
+    end = time.thread_time()
+
+    producer.join()
+    clasificador.EXPORTER.flush()
+    clasificador.close_history()
+    latencies = sorted(done - queued for queued, done in zip(enqueued_at, stub_app.processed_at))
+    scan_cpu_s = end - (stub_app.ready_cpu if stub_app.ready_cpu is not None else start)
+    return end - start, scan_cpu_s, latencies
+
+
+def measure_once(workload, workdir, seed_workbook):
+    reset_workdir(workdir, seed_workbook)
+    clasificador.app = StubApp()
+    start = time.perf_counter()
+    clasificador.load_initial_data()
+    load_s = time.perf_counter() - start
+    clasificador.close_history()
+
+    reset_workdir(workdir, seed_workbook)
+    cpu_s, scan_cpu_s, latencies = run_worker(workload, StubApp())
+
+    start = time.perf_counter()
+    clasificador.export_snapshot(clasificador.build_snapshot(), clasificador.FILE_PATH)
+    save_s = time.perf_counter() - start
+
+    scans = len(workload['lines'])
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)] if latencies else 0.0
+    return {
+        'load_s': load_s,
+        'worker_cpu_s': cpu_s,
+        'per_scan_ms': scan_cpu_s / scans * 1000,
+        'utilization': scan_cpu_s / (scans / workload['rate']),
+        'p95_latency_ms': p95 * 1000,
+        'save_s': save_s,
+    }
+
+
+def summarize(samples):
+    result = {}
+    for metric in samples[0]:
+        values = [sample[metric] for sample in samples]
+        median = statistics.median(values)
+        result[metric] = round(median, 4)
+        result[f"{metric}_spread"] = round((max(values) - min(values)) / median, 4) if median else 0.0
+    return result
+
+
+def run_profile(name, scale, seed, repeats):
+    rng = random.Random(seed)
+    workload = PROFILES[name](rng, scale)
+
+    base_dir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    workdir = os.path.join(base_dir, "salida")
+    messagebox = StubMessagebox()
+    clasificador.messagebox = messagebox
+
+    try:
+        seed_workbook = None
+        if workload.get('preload'):
+            seed_dir = os.path.join(base_dir, "semilla")
+            os.makedirs(seed_dir)
+            write_preloaded_workbook(seed_dir, workload['preload'])
+            seed_workbook = os.path.join(seed_dir, clasificador.OUTPUT_FILE_NAME)
+
+        measure_once(workload, workdir, seed_workbook)
+        samples = [measure_once(workload, workdir, seed_workbook) for _ in range(repeats)]
+
+        reset_workdir(workdir, seed_workbook)
+        tracemalloc.start()
+        run_worker(workload, StubApp())
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        if messagebox.errors:
+            raise RuntimeError("; ".join(messagebox.errors))
+
+        result = {'scans': len(workload['lines']), 'rate': workload['rate'], 'repeats': repeats}
+        result.update(summarize(samples))
+        result['saturated'] = result['utilization'] > SATURATION_LIMIT
+        result['peak_mb'] = round(peak / 2**20, 2)
+        return result
+    finally:
+        clasificador.PROCESS_RUNNING = False
+        clasificador.EXPORTER.flush()
+        clasificador.close_history()
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+
+def compare(name, result, baseline, threshold):
+    regressions = []
+    for metric in GATED_METRICS:
+        if metric not in baseline:
+            continue
+        if metric == 'p95_latency_ms' and (result['saturated'] or baseline.get('saturated')):
+            continue
+        old, new = baseline[metric], result[metric]
+        allowed = threshold + 2 * baseline.get(f"{metric}_spread", 0.0)
+        if new > old * (1 + allowed) and new - old > METRIC_FLOORS[metric]:
+            regressions.append(f"{name}.{metric}: {old} -> {new} "
+                               f"(+{(new - old) / old * 100 if old else 0:.0f}%, tolerado {allowed * 100:.0f}%)")
+    return regressions
+
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {'profiles': {}}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baselines(path, baselines):
+    baselines['python'] = platform.python_version()
+    baselines['platform'] = platform.platform()
+    baselines['pandas'] = pd.__version__
+    baselines['recorded_at'] = time.strftime("%Y-%m-%d %H:%M:%S")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de regresion del clasificador.")
+    parser.add_argument('--profile', action='append', choices=sorted(PROFILES),
+                        help="perfil a ejecutar (repetible); por defecto todos")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="regresion relativa tolerada (0.25 = 25%%)")
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help="multiplica el tamano de cada perfil")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS,
+                        help="ejecuciones medidas por perfil, tras una de calentamiento; se usa la mediana")
+    parser.add_argument('--require-baseline', action='store_true',
+                        help="falla si un perfil no tiene baseline en lugar de registrarla")
+    parser.add_argument('--update-baseline', action='store_true',
+                        help="sobrescribe la baseline con los resultados actuales")
+    args = parser.parse_args(argv)
+
+    baselines = load_baselines(args.baseline)
+    profiles = baselines.setdefault('profiles', {})
+    regressions = []
+    missing = []
+    recorded = False
+
+    for name in args.profile or list(PROFILES):
+        result = run_profile(name, args.scale, args.seed, args.repeats)
+        result['scale'] = args.scale
+        print(f"{name}: " + ", ".join(f"{k}={v}" for k, v in result.items()))
+        if result['saturated']:
+            print(f"  {name} saturado: utilizacion {result['utilization']:.0%} > {SATURATION_LIMIT:.0%}; "
+                  "p95_latency_ms no se compara")
+
+        baseline = profiles.get(name)
+        if args.update_baseline:
+            profiles[name] = result
+            recorded = True
+        elif baseline is None:
+            if args.require_baseline:
+                missing.append(name)
+            else:
+                print(f"  {name} no tenia baseline; se registra esta ejecucion")
+                profiles[name] = result
+                recorded = True
+        elif baseline.get('scale') != args.scale:
+            if args.require_baseline:
+                missing.append(f"{name} (scale={args.scale})")
+            else:
+                print(f"  baseline de {name} registrada con scale={baseline.get('scale')}; no se compara")
+        else:
+            regressions.extend(compare(name, result, baseline, args.threshold))
+
+    if recorded:
+        save_baselines(args.baseline, baselines)
+        print(f"Baseline guardada en {args.baseline}")
+
+    if missing:
+        print("SIN BASELINE: " + ", ".join(missing))
+    if regressions:
+        print("REGRESIONES DE RENDIMIENTO:")
+        for line in regressions:
+            print(f"  {line}")
+    if missing or regressions:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
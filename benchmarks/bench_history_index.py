@@ -0,0 +1,90 @@
+"""Mide huella y latencia de HistoryIndex con un historial grande.
+
+Reproduce las cifras documentadas en history_index.py:
+
+    python benchmarks/bench_history_index.py                 # 10M de codigos
+    python benchmarks/bench_history_index.py --codes 1000000 --lookups 50000
+
+Genera codes.idx directamente (ordenar 10M de claves en memoria requiere
+~1.5 GB de RAM y unos 30 s), y luego mide la reconstruccion del filtro sin
+bloom.bin, una compactacion, la apertura con bloom.bin y la latencia de
+consultas para codigos nuevos y presentes.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from history_index import HistoryIndex, code_key
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def write_codes_file(folder, count):
+    keys = sorted({code_key(f"DHL\tJD{i:012d}") for i in range(count)})
+    with open(os.path.join(folder, 'codes.idx'), 'wb') as f:
+        f.write(b''.join(keys))
+    return len(keys)
+
+
+def lookup_latency(index, codes):
+    start = time.perf_counter()
+    found = sum(index.contains(code) for code in codes)
+    return found, (time.perf_counter() - start) / len(codes) * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Huella y latencia del historial de codigos.")
+    parser.add_argument('--codes', type=int, default=10_000_000)
+    parser.add_argument('--lookups', type=int, default=100_000)
+    parser.add_argument('--capacity', type=int, default=None,
+                        help="capacidad del filtro; por defecto --codes + 1000")
+    parser.add_argument('--folder', default=None,
+                        help="carpeta de trabajo; por defecto una temporal que se borra al final")
+    args = parser.parse_args(argv)
+
+    folder = args.folder or tempfile.mkdtemp(prefix="bench_historial_")
+    capacity = args.capacity or args.codes + 1000
+    try:
+        os.makedirs(folder, exist_ok=True)
+        stored, gen_s = timed(write_codes_file, folder, args.codes)
+        print(f"codes.idx: {stored} claves, {os.path.getsize(os.path.join(folder, 'codes.idx')) / 1e6:.1f} MB ({gen_s:.1f} s)")
+
+        index, rebuild_s = timed(HistoryIndex, folder, capacity)
+        print(f"reconstruccion del filtro sin bloom.bin: {rebuild_s:.1f} s")
+        index.add("DHL\tNUEVO")
+        _, compact_s = timed(index.compact)
+        print(f"compactacion: {compact_s:.1f} s")
+        index.close()
+
+        index, open_s = timed(HistoryIndex, folder, capacity)
+        print(f"apertura con bloom.bin: {open_s * 1000:.0f} ms")
+        print(f"filtro: {index.num_bits} bits = {len(index.bits) / 2**20:.1f} MiB, "
+              f"k={index.num_hashes}, capacidad={index.capacity}")
+
+        missing = [f"DHL\tNUEVO{i:09d}" for i in range(args.lookups)]
+        present = [f"DHL\tJD{(i * 7919) % args.codes:012d}" for i in range(args.lookups)]
+        lookup_latency(index, present[:1000])
+
+        _, miss_us = lookup_latency(index, missing)
+        found, hit_us = lookup_latency(index, present)
+        to_disk = sum(index.might_contain(code) for code in missing)
+        print(f"codigo nuevo: {miss_us:.1f} us/consulta, {to_disk / args.lookups:.2%} pasan el filtro y van a disco")
+        print(f"codigo presente: {hit_us:.1f} us/consulta, encontrados {found}/{args.lookups}")
+        index.close()
+    finally:
+        if not args.folder:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
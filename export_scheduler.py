@@ -0,0 +1,198 @@
+"""Exportacion del libro en segundo plano con reemplazo atomico.
+
+ExportScheduler escribe cada snapshot en un archivo temporal junto al destino
+y lo coloca con os.replace. Solo se conserva el snapshot pendiente mas
+reciente. Si el destino esta bloqueado (Excel abierto) el temporal ya escrito
+se conserva y solo se reintenta el os.replace cada retry_interval; pasado
+fallback_after, o al llamar shutdown(), el temporal se renombra a una copia
+con fecha y hora para no perder los datos.
+
+latest() devuelve el snapshot mas reciente que aun no llego a disco (pendiente
+o escrito en el temporal), para que una nueva sesion parta de el en lugar de
+releer un libro desactualizado.
+"""
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+
+def temp_path_for(target, version):
+    folder, name = os.path.split(target)
+    base, ext = os.path.splitext(name)
+    return os.path.join(folder, f".{base}.{os.getpid()}.v{version}.tmp{ext}")
+
+
+def timestamped_path(target):
+    base, ext = os.path.splitext(target)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    path = f"{base}_{stamp}{ext}"
+    n = 1
+    while os.path.exists(path):
+        n += 1
+        path = f"{base}_{stamp}_{n}{ext}"
+    return path
+
+
+def is_timestamped_copy(target, path):
+    base, ext = os.path.splitext(os.path.basename(target))
+    pattern = re.escape(base) + r"_\d{8}_\d{6}(_\d+)?" + re.escape(ext)
+    return re.fullmatch(pattern, os.path.basename(path)) is not None
+
+
+def atomic_export(write, snapshot, target):
+    folder = os.path.dirname(target)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    tmp_path = temp_path_for(target, 0)
+    try:
+        write(tmp_path, snapshot)
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return target
+
+
+class ExportScheduler:
+    def __init__(self, write, on_status=None, on_committed=None, retry_interval=5,
+                 fallback_after=60, replace=os.replace):
+        self.write = write
+        self.on_status = on_status
+        self.on_committed = on_committed
+        self.retry_interval = retry_interval
+        self.fallback_after = fallback_after
+        self.replace = replace
+        self.cond = threading.Condition()
+        self.pending = None
+        self.outstanding = None
+        self.version = 0
+        self.busy = False
+        self.closing = False
+        self.thread = None
+
+    def submit(self, snapshot, target):
+        with self.cond:
+            self.version += 1
+            self.pending = (self.version, snapshot, target)
+            self.outstanding = (self.version, snapshot)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run)
+                self.thread.daemon = True
+                self.thread.start()
+            self.cond.notify_all()
+            return self.version
+
+    def latest(self):
+        with self.cond:
+            return self.outstanding[1] if self.outstanding else None
+
+    def flush(self, timeout=None):
+        with self.cond:
+            return self.cond.wait_for(lambda: self.pending is None and not self.busy, timeout)
+
+    def shutdown(self, timeout=None):
+        with self.cond:
+            self.closing = True
+            self.cond.notify_all()
+        return self.flush(timeout)
+
+    def _call(self, callback, *args):
+        if callback:
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"Error al notificar exportación: {e}")
+
+    def _finish(self, status, version, detail, snapshot=None):
+        if status in ('saved', 'fallback'):
+            with self.cond:
+                if self.outstanding and self.outstanding[0] <= version:
+                    self.outstanding = None
+            self._call(self.on_committed, status, version, snapshot, detail)
+        self._call(self.on_status, status, version, detail)
+        with self.cond:
+            self.busy = False
+            self.cond.notify_all()
+
+    def _discard(self, path):
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            print(f"No se pudo borrar el temporal {path}: {e}")
+
+    def _prepare(self, version, snapshot, target):
+        folder = os.path.dirname(target)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp_path = temp_path_for(target, version)
+        try:
+            self.write(tmp_path, snapshot)
+        except BaseException:
+            self._discard(tmp_path)
+            raise
+        return tmp_path
+
+    def _run(self):
+        prepared = None
+        locked_since = None
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending is not None)
+                version, snapshot, target = self.pending
+                self.pending = None
+                self.busy = True
+
+            if prepared and prepared[0] != version:
+                self._discard(prepared[1])
+                prepared = None
+
+            try:
+                if prepared is None:
+                    prepared = (version, self._prepare(version, snapshot, target))
+            except Exception as e:
+                self._finish('error', version, e)
+                continue
+
+            try:
+                self.replace(prepared[1], target)
+            except PermissionError:
+                now = time.monotonic()
+                first_lock = locked_since is None
+                if first_lock:
+                    locked_since = now
+                if self.closing or now - locked_since >= self.fallback_after:
+                    fallback = timestamped_path(target)
+                    try:
+                        self.replace(prepared[1], fallback)
+                        status, detail = 'fallback', fallback
+                    except Exception as e:
+                        self._discard(prepared[1])
+                        status, detail = 'error', e
+                    prepared = None
+                    locked_since = None
+                    self._finish(status, version, detail, snapshot)
+                    continue
+
+                with self.cond:
+                    if self.pending is None:
+                        self.pending = (version, snapshot, target)
+                    self.busy = False
+                    self.cond.notify_all()
+                if first_lock:
+                    self._call(self.on_status, 'locked', version, target)
+                with self.cond:
+                    self.cond.wait_for(lambda: self.closing or self.pending[0] != version,
+                                       self.retry_interval)
+                continue
+            except Exception as e:
+                self._discard(prepared[1])
+                prepared = None
+                self._finish('error', version, e)
+                continue
+
+            prepared = None
+            locked_since = None
+            self._finish('saved', version, target, snapshot)
@@ -0,0 +1,175 @@
+import os
+
+import pytest
+
+pytest.importorskip("tkinter")
+pd = pytest.importorskip("pandas")
+pytest.importorskip("xlsxwriter")
+pytest.importorskip("openpyxl")
+
+import ClasificadorHID_PRO as clasificador
+from export_scheduler import ExportScheduler
+
+
+class StubApp:
+    def __init__(self):
+        self.save_button = self
+
+    def after(self, delay, func, *args):
+        pass
+
+    def config(self, *args, **kwargs):
+        pass
+
+    def update_initial_interface(self):
+        pass
+
+    def update_scan_interface(self, store, code, status):
+        pass
+
+    def set_inactive_mode(self):
+        pass
+
+    def show_banner_message(self, text, duration=3000):
+        pass
+
+    def show_export_status(self, status, version, detail):
+        pass
+
+
+class StubMessagebox:
+    def showerror(self, title, message):
+        raise AssertionError(f"{title}: {message}")
+
+
+class LockableReplace:
+    def __init__(self):
+        self.locked = False
+
+    def __call__(self, src, dst):
+        if self.locked and os.path.basename(dst) == clasificador.OUTPUT_FILE_NAME:
+            raise PermissionError("archivo abierto")
+        os.replace(src, dst)
+
+
+@pytest.fixture
+def lock(tmp_path, monkeypatch):
+    folder = str(tmp_path)
+    replace = LockableReplace()
+    monkeypatch.setattr(clasificador, 'OUTPUT_FOLDER_PATH', folder)
+    monkeypatch.setattr(clasificador, 'FILE_PATH', os.path.join(folder, clasificador.OUTPUT_FILE_NAME))
+    monkeypatch.setattr(clasificador, 'HISTORY_FOLDER_PATH', os.path.join(folder, "historial"))
+    monkeypatch.setattr(clasificador, 'app', StubApp(), raising=False)
+    monkeypatch.setattr(clasificador, 'messagebox', StubMessagebox())
+    monkeypatch.setattr(clasificador, 'FALLBACK_FILES', {})
+    monkeypatch.setattr(clasificador, 'COMMITTED_ROWS', {})
+    monkeypatch.setattr(clasificador, 'HISTORY_CAPACITY', 1000)
+    monkeypatch.setattr(clasificador, 'HISTORY', None)
+    monkeypatch.setattr(clasificador, 'EXPORTER', ExportScheduler(
+        clasificador.write_workbook, on_committed=clasificador.export_committed,
+        retry_interval=0.01, fallback_after=600, replace=replace))
+    yield replace
+    clasificador.EXPORTER.shutdown(timeout=5)
+    clasificador.close_history()
+
+
+def run_session(*lines):
+    for line in lines:
+        clasificador.SCAN_QUEUE.put(line)
+    clasificador.PROCESS_RUNNING = False
+    clasificador.process_worker()
+
+
+def sheet_codes(path, sheet):
+    return pd.read_excel(path, sheet_name=sheet, dtype={'Code': str})['Code'].tolist()
+
+
+def snapshot_of(codes):
+    return {'DHL': pd.DataFrame({'Timestamp': "2024-03-01 08:00:00", 'Code': codes, 'Status': 'OK'})}
+
+
+def test_restart_while_export_locked_keeps_scans(lock):
+    run_session("DHL,A1")
+    assert clasificador.EXPORTER.flush(5)
+
+    lock.locked = True
+    run_session("DHL,A2")
+    assert clasificador.EXPORTER.flush(0.2) is False
+    run_session("DHL,A3")
+    assert clasificador.EXPORTER.flush(0.2) is False
+
+    lock.locked = False
+    assert clasificador.EXPORTER.flush(5)
+    assert sheet_codes(clasificador.FILE_PATH, 'DHL') == ['A1', 'A2', 'A3']
+    assert clasificador.history_key('DHL', 'A2') in clasificador.HISTORY
+
+
+def test_fallback_copy_is_merged_on_next_session_and_then_deleted(lock):
+    lock.locked = True
+    clasificador.EXPORTER.fallback_after = 0.05
+    run_session("DHL,A1")
+    assert clasificador.EXPORTER.flush(5)
+    fallbacks = clasificador.find_fallback_files()
+    assert len(fallbacks) == 1
+
+    lock.locked = False
+    run_session("DHL,A2")
+    assert clasificador.EXPORTER.flush(5)
+    assert sheet_codes(clasificador.FILE_PATH, 'DHL') == ['A1', 'A2']
+    assert not os.path.exists(fallbacks[0])
+    assert clasificador.FALLBACK_FILES == {}
+
+
+def test_load_merges_only_timestamped_fallbacks(lock):
+    folder = clasificador.OUTPUT_FOLDER_PATH
+    fallback = os.path.join(folder, "Clasificacion_20240301_081500.xlsx")
+    archive = os.path.join(folder, "Clasificacion_marzo_archivo.xlsx")
+    clasificador.export_snapshot(snapshot_of(['A1']), clasificador.FILE_PATH)
+    clasificador.export_snapshot(snapshot_of(['A1', 'B1']), fallback)
+    clasificador.export_snapshot(snapshot_of(['C1']), archive)
+
+    clasificador.load_initial_data()
+
+    assert clasificador.DATA_CACHE['DHL']['Code'].tolist() == ['A1', 'B1']
+    assert clasificador.COUNTS['DHL'] == 2
+    assert list(clasificador.FALLBACK_FILES) == [fallback]
+
+
+def test_export_committed_deletes_only_covered_fallbacks(lock):
+    folder = clasificador.OUTPUT_FOLDER_PATH
+    older = os.path.join(folder, "Clasificacion_20240301_081500.xlsx")
+    newer = os.path.join(folder, "Clasificacion_20240301_091500.xlsx")
+    newest = os.path.join(folder, "Clasificacion_20240301_101500.xlsx")
+    archive = os.path.join(folder, "Clasificacion_marzo_archivo.xlsx")
+    for path in (older, newer, newest, archive):
+        open(path, 'w').close()
+    clasificador.FALLBACK_FILES.update({older: 1, newer: 3})
+    snapshot = snapshot_of(['A1'])
+
+    clasificador.export_committed('fallback', 4, snapshot, newest)
+    assert all(os.path.exists(p) for p in (older, newer, newest))
+
+    clasificador.export_committed('saved', 3, snapshot, clasificador.FILE_PATH)
+    assert not os.path.exists(older)
+    assert os.path.exists(newer) and os.path.exists(newest) and os.path.exists(archive)
+    assert clasificador.FALLBACK_FILES == {newer: 3, newest: 4}
+
+
+def test_commit_history_only_adds_new_rows(lock, monkeypatch):
+    added = []
+
+    class RecordingHistory:
+        pending = ()
+
+        def add(self, key):
+            added.append(key)
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(clasificador, 'HISTORY', RecordingHistory())
+
+    clasificador.commit_history(snapshot_of(['A1', 'A2']))
+    clasificador.commit_history(snapshot_of(['A1', 'A2', 'A3']))
+
+    assert added == [clasificador.history_key('DHL', code) for code in ['A1', 'A2', 'A3']]
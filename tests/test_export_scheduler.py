@@ -0,0 +1,205 @@
+import os
+import threading
+import time
+
+from export_scheduler import ExportScheduler, is_timestamped_copy, timestamped_path
+
+
+class FakeTarget:
+    def __init__(self, locked_attempts=0):
+        self.locked_attempts = locked_attempts
+        self.always_locked = False
+        self.writes = []
+        self.replace_calls = 0
+
+    def write(self, path, snapshot):
+        self.writes.append(snapshot)
+        with open(path, 'w') as f:
+            f.write(snapshot)
+
+    def replace(self, src, dst):
+        if dst.endswith('Clasificacion.xlsx'):
+            self.replace_calls += 1
+            if self.always_locked or self.replace_calls <= self.locked_attempts:
+                raise PermissionError("archivo abierto")
+        os.replace(src, dst)
+
+
+def make_scheduler(fake, events, **kwargs):
+    kwargs.setdefault('retry_interval', 0.01)
+    kwargs.setdefault('fallback_after', 60)
+    return ExportScheduler(fake.write, on_status=lambda *args: events.append(args),
+                           replace=fake.replace, **kwargs)
+
+
+def leftovers(folder):
+    return [name for name in os.listdir(folder) if '.tmp' in name]
+
+
+def test_only_newest_pending_snapshot_is_written(tmp_path):
+    target = str(tmp_path / "Clasificacion.xlsx")
+    started = threading.Event()
+    release = threading.Event()
+    fake = FakeTarget()
+    first_write = fake.write
+
+    def slow_write(path, snapshot):
+        first_write(path, snapshot)
+        if snapshot == 'v1':
+            started.set()
+            release.wait(2)
+
+    fake.write = slow_write
+    events = []
+    scheduler = make_scheduler(fake, events)
+
+    scheduler.submit('v1', target)
+    assert started.wait(2)
+    scheduler.submit('v2', target)
+    scheduler.submit('v3', target)
+    release.set()
+
+    assert scheduler.flush(2)
+    assert fake.writes == ['v1', 'v3']
+    with open(target) as f:
+        assert f.read() == 'v3'
+    assert [e[0] for e in events] == ['saved', 'saved']
+    assert leftovers(tmp_path) == []
+
+
+def test_locked_target_retries_replace_without_rewriting(tmp_path):
+    target = str(tmp_path / "Clasificacion.xlsx")
+    fake = FakeTarget(locked_attempts=3)
+    events = []
+    scheduler = make_scheduler(fake, events)
+
+    scheduler.submit('v1', target)
+
+    assert scheduler.flush(2)
+    assert fake.writes == ['v1']
+    assert fake.replace_calls == 4
+    assert [e[0] for e in events] == ['locked', 'saved']
+    assert leftovers(tmp_path) == []
+
+
+def test_falls_back_to_timestamped_copy_after_fallback_after(tmp_path):
+    target = str(tmp_path / "Clasificacion.xlsx")
+    fake = FakeTarget()
+    fake.always_locked = True
+    events = []
+    committed = []
+    scheduler = make_scheduler(fake, events, fallback_after=0.05)
+    scheduler.on_committed = lambda *args: committed.append(args)
+
+    scheduler.submit('v1', target)
+
+    assert scheduler.flush(2)
+    status, version, fallback = events[-1]
+    assert status == 'fallback'
+    assert os.path.basename(fallback).startswith("Clasificacion_")
+    with open(fallback) as f:
+        assert f.read() == 'v1'
+    assert not os.path.exists(target)
+    assert committed == [('fallback', 1, 'v1', fallback)]
+    assert fake.writes == ['v1']
+    assert leftovers(tmp_path) == []
+
+
+def test_shutdown_falls_back_immediately(tmp_path):
+    target = str(tmp_path / "Clasificacion.xlsx")
+    fake = FakeTarget()
+    fake.always_locked = True
+    events = []
+    scheduler = make_scheduler(fake, events, retry_interval=60, fallback_after=600)
+
+    scheduler.submit('v1', target)
+    deadline = time.monotonic() + 2
+    while not events and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert events[0][0] == 'locked'
+
+    start = time.monotonic()
+    assert scheduler.shutdown(timeout=2)
+    assert time.monotonic() - start < 1
+    assert events[-1][0] == 'fallback'
+
+
+def test_flush_timeout_returns_while_target_locked(tmp_path):
+    target = str(tmp_path / "Clasificacion.xlsx")
+    fake = FakeTarget()
+    fake.always_locked = True
+    scheduler = make_scheduler(fake, [], retry_interval=0.01, fallback_after=600)
+
+    scheduler.submit('v1', target)
+
+    start = time.monotonic()
+    assert scheduler.flush(timeout=0.1) is False
+    assert time.monotonic() - start < 1
+    assert scheduler.shutdown(timeout=2)
+
+
+def test_write_error_is_reported(tmp_path):
+    target = str(tmp_path / "Clasificacion.xlsx")
+
+    def broken_write(path, snapshot):
+        raise ValueError("sin columnas")
+
+    events = []
+    scheduler = ExportScheduler(broken_write, on_status=lambda *args: events.append(args))
+
+    scheduler.submit('v1', target)
+
+    assert scheduler.flush(2)
+    assert events[0][0] == 'error'
+    assert isinstance(events[0][2], ValueError)
+    assert leftovers(tmp_path) == []
+
+
+def test_latest_keeps_snapshot_until_it_reaches_disk(tmp_path):
+    target = str(tmp_path / "Clasificacion.xlsx")
+    fake = FakeTarget()
+    fake.always_locked = True
+    scheduler = make_scheduler(fake, [], retry_interval=60, fallback_after=600)
+
+    assert scheduler.latest() is None
+    scheduler.submit('v1', target)
+    assert scheduler.flush(timeout=0.1) is False
+    assert scheduler.latest() == 'v1'
+
+    fake.always_locked = False
+    scheduler.submit('v2', target)
+    assert scheduler.flush(2)
+    assert scheduler.latest() is None
+
+
+def test_latest_is_kept_after_write_error(tmp_path):
+    def broken_write(path, snapshot):
+        raise ValueError("sin columnas")
+
+    scheduler = ExportScheduler(broken_write)
+    scheduler.submit('v1', str(tmp_path / "Clasificacion.xlsx"))
+
+    assert scheduler.flush(2)
+    assert scheduler.latest() == 'v1'
+
+
+def test_timestamped_path_avoids_collisions(tmp_path):
+    target = str(tmp_path / "Clasificacion.xlsx")
+    first = timestamped_path(target)
+    open(first, 'w').close()
+    second = timestamped_path(target)
+    open(second, 'w').close()
+    third = timestamped_path(target)
+
+    assert len({first, second, third}) == 3
+    assert all(is_timestamped_copy(target, p) for p in (first, second, third))
+
+
+def test_is_timestamped_copy_ignores_user_files(tmp_path):
+    target = str(tmp_path / "Clasificacion.xlsx")
+
+    assert is_timestamped_copy(target, "Clasificacion_20240301_081500.xlsx")
+    assert is_timestamped_copy(target, "Clasificacion_20240301_081500_2.xlsx")
+    assert not is_timestamped_copy(target, "Clasificacion_marzo_archivo.xlsx")
+    assert not is_timestamped_copy(target, "Clasificacion_20240301.xlsx")
+    assert not is_timestamped_copy(target, ".Clasificacion.123.v1.tmp.xlsx")
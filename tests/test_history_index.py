@@ -0,0 +1,156 @@
+import os
+import threading
+
+import history_index
+from history_index import KEY_SIZE, HistoryIndex
+
+
+def codes(prefix, count):
+    return [f"{prefix}{i:06d}" for i in range(count)]
+
+
+def test_add_and_contains_survive_reopen(tmp_path):
+    index = HistoryIndex(str(tmp_path), capacity=100)
+    for code in codes("A", 50):
+        assert index.add(code)
+    assert not index.add("A000007")
+    index.close()
+
+    index = HistoryIndex(str(tmp_path), capacity=100)
+    assert all(index.contains(code) for code in codes("A", 50))
+    assert not index.contains("B000000")
+    assert len(index) == 50
+    index.close()
+
+
+def test_no_false_negatives_after_compact(tmp_path):
+    index = HistoryIndex(str(tmp_path), capacity=1000)
+    for code in codes("A", 300):
+        index.add(code)
+    index.compact()
+    for code in codes("B", 300):
+        index.add(code)
+    index.compact()
+
+    assert index.pending == set()
+    assert os.path.getsize(index.pending_path) == 0
+    assert index.disk_count == 600
+    assert all(code in index for code in codes("A", 300) + codes("B", 300))
+    index.close()
+
+    index = HistoryIndex(str(tmp_path), capacity=1000)
+    assert all(code in index for code in codes("A", 300) + codes("B", 300))
+    index.close()
+
+
+def test_compact_doubles_capacity_when_full(tmp_path):
+    index = HistoryIndex(str(tmp_path), capacity=100)
+    old_bits = index.num_bits
+    for code in codes("A", 150):
+        index.add(code)
+    index.compact()
+
+    assert index.capacity == 300
+    assert index.num_bits > old_bits
+    assert all(code in index for code in codes("A", 150))
+    index.close()
+
+    index = HistoryIndex(str(tmp_path), capacity=100)
+    assert index.capacity == 300
+    assert all(code in index for code in codes("A", 150))
+    index.close()
+
+
+def test_rebuilds_bloom_when_file_missing(tmp_path):
+    index = HistoryIndex(str(tmp_path), capacity=1000)
+    for code in codes("A", 200):
+        index.add(code)
+    index.compact()
+    index.add("PENDIENTE")
+    index.close()
+
+    os.remove(os.path.join(str(tmp_path), 'bloom.bin'))
+
+    index = HistoryIndex(str(tmp_path), capacity=1000)
+    assert all(code in index for code in codes("A", 200))
+    assert "PENDIENTE" in index
+    assert len(index) == 201
+    index.close()
+
+
+def test_truncated_pending_log_is_repaired(tmp_path):
+    index = HistoryIndex(str(tmp_path), capacity=1000)
+    index.add("A")
+    index.add("B")
+    index.close()
+
+    pending_path = os.path.join(str(tmp_path), 'pending.log')
+    with open(pending_path, 'ab') as f:
+        f.write(b'\x01\x02\x03')
+
+    index = HistoryIndex(str(tmp_path), capacity=1000)
+    assert os.path.getsize(pending_path) == 2 * KEY_SIZE
+    assert "A" in index and "B" in index
+    index.add("C")
+    index.close()
+
+    index = HistoryIndex(str(tmp_path), capacity=1000)
+    assert all(code in index for code in ["A", "B", "C"])
+    assert len(index) == 3
+    index.close()
+
+
+def test_adds_during_compact_are_kept(tmp_path):
+    index = HistoryIndex(str(tmp_path), capacity=10000)
+    for code in codes("A", 2000):
+        index.add(code)
+
+    worker = threading.Thread(target=index.compact)
+    worker.start()
+    for code in codes("B", 500):
+        index.add(code)
+    worker.join()
+    index.close()
+
+    index = HistoryIndex(str(tmp_path), capacity=10000)
+    assert all(code in index for code in codes("A", 2000) + codes("B", 500))
+    assert len(index) == 2500
+    index.close()
+
+
+def test_temp_files_are_written_without_holding_the_lock(tmp_path, monkeypatch):
+    index = HistoryIndex(str(tmp_path), capacity=1000)
+    for code in codes("A", 100):
+        index.add(code)
+
+    real_fsync = os.fsync
+    lock_free = []
+
+    def probe():
+        acquired = index.lock.acquire(timeout=0.2)
+        lock_free.append(acquired)
+        if acquired:
+            index.lock.release()
+
+    def fsync(fd):
+        real_fsync(fd)
+        worker = threading.Thread(target=probe)
+        worker.start()
+        worker.join()
+        if len(lock_free) == 2:
+            adder = threading.Thread(target=index.add, args=("TARDE",))
+            adder.start()
+            adder.join()
+
+    monkeypatch.setattr(history_index.os, 'fsync', fsync)
+    index.compact()
+    monkeypatch.undo()
+
+    assert lock_free == [True, True, True, False]
+    assert "TARDE" in index
+    index.close()
+
+    index = HistoryIndex(str(tmp_path), capacity=1000)
+    assert all(code in index for code in codes("A", 100) + ["TARDE"])
+    assert len(index) == 101
+    index.close()